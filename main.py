@@ -16,19 +16,31 @@ Environment Variables:
 - SERVICE_NAME: Name of the service (default: main-service)
 - REPLICA_COUNT: Expected number of replicas (default: 3)
 - PORT: HTTP port to listen on (default: 8080)
+- SCAN_MODE: "connect" or "syn" half-open probes (default: connect)
+- ICMP_PREFILTER: Ping hosts before connect-probing them (default: 1)
+- SCAN_DEADLINE: Seconds one discovery round may take (default: 2.0)
 """
 
 import os
 import socket
+import asyncio
+import atexit
+import errno
+import random
+import resource
+import selectors
+import struct
+import threading
 import time
 import json
+import functools
 import concurrent.futures
 from datetime import datetime
-from urllib.request import urlopen
-from urllib.error import URLError
 
+import httpx
+import jinja2
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 
 app = FastAPI(
     title="Replica Communication Demo",
@@ -43,82 +55,674 @@ PORT = int(os.environ.get("PORT", "8080"))
 HOSTNAME = socket.gethostname()
 MY_IP = socket.gethostbyname(HOSTNAME)
 
+# MY_IP never changes, so split it once for the subnet scans
+_IP_PARTS = MY_IP.split(".")
+_IP_BASE2 = ".".join(_IP_PARTS[:2])  # e.g., "10.244"
+_MY_THIRD = int(_IP_PARTS[2])
+
+# Peer snapshot: a background task re-discovers peers every REFRESH_INTERVAL
+# seconds and requests only read the latest result. The last result is
+# persisted to disk so a restarted process has something to serve right away.
+REFRESH_INTERVAL = 15
+PEER_CACHE_FILE = "/tmp/peers.json"
+_peer_cache = {"data": None}
+_refresher = None
+
+# Gossip membership: ip -> {"heartbeat": n, "updated": monotonic time}.
+# Replicas exchange these tables via /peers_raw so that, once anyone has found
+# the cluster, nobody needs to scan the subnet again. Our own heartbeat goes
+# up every refresh round; members whose heartbeat stops increasing expire.
+GOSSIP_STALE_AFTER = 3 * REFRESH_INTERVAL
+_members = {}
+_heartbeat = 0
+
+# Wall-clock budget for one discovery round (gossip plus subnet scan). On
+# expiry the partial result is merged with the last snapshot. The identity
+# lookups that follow are not part of the budget.
+SCAN_DEADLINE = float(os.environ.get("SCAN_DEADLINE", "2.0"))
+_scan_stats = {"deadline_hit": 0}
+
+# Shared HTTP client for peer-to-peer calls; keep-alive connections are
+# reused across discovery rounds
+_http = httpx.AsyncClient(timeout=1.0, limits=httpx.Limits(max_connections=200))
+
+# Subnet scan tuning: how many adjacent /24s to probe in the first pass,
+# how many /24s the full sweep covers, and how many probes may be in flight
+# (capped so a batch of sockets stays within the open file limit)
+SCAN_RING = 2
+SCAN_MAX_THIRD = 50
+SCAN_CONCURRENCY = 2000
+_PROBE_BATCH = max(64, min(SCAN_CONCURRENCY, resource.getrlimit(resource.RLIMIT_NOFILE)[0] - 256))
+
+# Once a probe succeeds after T seconds, outstanding probes only get
+# max(RTT_TIMEOUT_FACTOR * T, MIN_PROBE_TIMEOUT) instead of the full timeout
+RTT_TIMEOUT_FACTOR = 3
+MIN_PROBE_TIMEOUT = 0.010
+
+# Third octets that have produced peers; scanned first with a short timeout.
+# The full sweep only runs when those come up short, at most every interval.
+FAST_SCAN_TIMEOUT = 0.05
+FULL_SCAN_INTERVAL = 120
+_hot_thirds = {_MY_THIRD}
+_last_full_scan = 0
+
+# Every candidate address of the full sweep, built once
+_CANDIDATE_IPS = tuple(
+    f"{_IP_BASE2}.{third}.{fourth}"
+    for third in range(SCAN_MAX_THIRD)
+    for fourth in range(1, 255)
+)
+
+# Long-lived threads for the blocking raw-socket sweeps (SYN and ICMP), so
+# requests don't pay for thread creation
+_scan_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="scan")
+atexit.register(_scan_pool.shutdown)
+
+# Probe type: "connect" (full TCP handshake) or "syn" (half-open, needs CAP_NET_RAW)
+SCAN_MODE = os.environ.get("SCAN_MODE", "connect")
+
+# Ping hosts before connect-probing them so dead IPs don't each cost a full
+# connect timeout; non-responders are skipped for ICMP_NEGATIVE_TTL seconds
+ICMP_PREFILTER = os.environ.get("ICMP_PREFILTER", "1") == "1"
+ICMP_NEGATIVE_TTL = 30
+
 
 def get_timestamp():
     """Return current timestamp in readable format."""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def discover_peers(port=8080, timeout=0.1):
+def _scan_order(my_third, known_thirds=(), ring=SCAN_RING, max_third=SCAN_MAX_THIRD):
     """
-    Discover peer replicas by scanning the pod network subnet.
+    Return (first_pass, fallback) lists of third octets in priority order.
 
-    This works because all pods in the same App Platform app share
-    a network where they can communicate via private IPs.
+    The first pass covers our own /24, the subnets peers have been found in
+    and a ring of +/-ring adjacent /24s. The fallback covers the rest of the
+    0..max_third range and is only scanned if the first pass comes up short.
+    """
+    first_pass = []
+    for third in [my_third] + list(known_thirds):
+        if third not in first_pass:
+            first_pass.append(third)
+    for offset in range(1, ring + 1):
+        for third in (my_third - offset, my_third + offset):
+            if 0 <= third < max_third and third not in first_pass:
+                first_pass.append(third)
+    fallback = [t for t in range(0, max_third) if t not in first_pass]
+    return first_pass, fallback
+
+
+def _adaptive_timeout(timeout, fastest_rtt):
+    """
+    Shrink a probe timeout to a few times the fastest RTT seen so far.
+
+    Live peers in the same VPC answer within a couple of milliseconds, so once
+    one has, waiting the full timeout only serves dead IPs.
+    """
+    if fastest_rtt is None:
+        return timeout
+    return min(timeout, max(RTT_TIMEOUT_FACTOR * fastest_rtt, MIN_PROBE_TIMEOUT))
+
+
+def _bulk_probe(ips, port, timeout, stop=None):
+    """
+    Probe ips with non-blocking TCP connects, one batch of sockets at a time.
+
+    Every socket in a batch starts its connect() up front; a single selector
+    (epoll on Linux) then waits for all of them, and SO_ERROR tells whether
+    the port was open. The timeout is tightened as soon as the first peer
+    (not this replica itself) answers (see _adaptive_timeout).
+    Returns early once `stop` (a threading.Event) is set.
+    Blocking; run it in an executor.
+    """
+    stop = stop or threading.Event()
+    found = set()
+    fastest_rtt = None
+    start = 0
+    while start < len(ips) and not stop.is_set():
+        selector = selectors.DefaultSelector()
+        socks = []
+        try:
+            for ip in ips[start:start + _PROBE_BATCH]:
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                except OSError:
+                    break  # Out of file descriptors; the rest go in the next batch
+                socks.append(sock)
+                sock.setblocking(False)
+                started = time.monotonic()
+                result = sock.connect_ex((ip, port))
+                if result == 0:
+                    found.add(ip)
+                elif result == errno.EINPROGRESS:
+                    selector.register(sock, selectors.EVENT_WRITE, (ip, started))
+
+            issued = time.monotonic()
+            deadline = issued + _adaptive_timeout(timeout, fastest_rtt)
+            while selector.get_map() and not stop.is_set() and (remaining := deadline - time.monotonic()) > 0:
+                for key, _ in selector.select(remaining):
+                    selector.unregister(key.fileobj)
+                    if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+                        continue
+                    ip, started = key.data
+                    found.add(ip)
+                    if ip == MY_IP:
+                        continue  # Loopback RTT says nothing about peers
+                    rtt = time.monotonic() - started
+                    if fastest_rtt is None or rtt < fastest_rtt:
+                        fastest_rtt = rtt
+                        deadline = min(deadline, issued + _adaptive_timeout(timeout, fastest_rtt))
+        finally:
+            selector.close()
+            for sock in socks:
+                sock.close()
+        if not socks:
+            break  # Not a single descriptor to spare
+        start += len(socks)
+    return found
+
+
+def _checksum(data):
+    """RFC 1071 internet checksum."""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _syn_packet(src_ip, dst_ip, src_port, dst_port, seq):
+    """Build a bare TCP SYN segment (the kernel adds the IP header)."""
+    offset_flags = (5 << 12) | 0x02  # 20-byte header, SYN
+    header = struct.pack("!HHIIHHHH", src_port, dst_port, seq, 0, offset_flags, 1024, 0, 0)
+    pseudo = socket.inet_aton(src_ip) + socket.inet_aton(dst_ip) + struct.pack("!BBH", 0, socket.IPPROTO_TCP, len(header))
+    checksum = _checksum(pseudo + header)
+    return header[:16] + struct.pack("!H", checksum) + header[18:]
+
+
+def _syn_scan(ips, port, timeout, stop=None):
     """
-    parts = MY_IP.split(".")
-    base = ".".join(parts[:2])  # e.g., "10.244"
-    my_third = int(parts[2])
+    Half-open (SYN) scan: send a raw SYN to every IP and collect SYN-ACK replies.
 
-    def check_ip(ip):
-        """Check if an IP has our service port open."""
+    Never completes the handshake, so the target never accept()s a connection
+    (our kernel answers the SYN-ACK with a RST). Requires CAP_NET_RAW. The
+    wait for replies is tightened once the first peer's SYN-ACK arrives.
+    Returns early once `stop` (a threading.Event) is set.
+    Blocking; run it in an executor.
+    """
+    stop = stop or threading.Event()
+    src_port = random.randint(40000, 60000)
+    seq = random.getrandbits(32)
+    sent_at = {}
+    found = set()
+    fastest_rtt = None
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(receiver, selectors.EVENT_READ)
+
+    def drain(wait):
+        nonlocal fastest_rtt
+        while selector.select(wait):
+            wait = 0
+            try:
+                packet = receiver.recv(1024)
+            except BlockingIOError:
+                return
+            ihl = (packet[0] & 0x0F) * 4
+            if len(packet) < ihl + 14:
+                continue
+            src = socket.inet_ntoa(packet[12:16])
+            sport, dport = struct.unpack("!HH", packet[ihl:ihl + 4])
+            flags = packet[ihl + 13]
+            if sport == port and dport == src_port and src in sent_at and flags & 0x12 == 0x12:
+                found.add(src)
+                if src == MY_IP:
+                    continue  # Loopback RTT says nothing about peers
+                rtt = time.monotonic() - sent_at[src]
+                if fastest_rtt is None or rtt < fastest_rtt:
+                    fastest_rtt = rtt
+
+    try:
+        for i, ip in enumerate(ips):
+            if stop.is_set():
+                return found
+            sent_at[ip] = time.monotonic()
+            try:
+                sender.sendto(_syn_packet(MY_IP, ip, src_port, port, seq), (ip, 0))
+            except OSError:
+                continue
+            if i % 256 == 255:
+                drain(0)
+        sent = time.monotonic()
+        while not stop.is_set() and (remaining := sent + _adaptive_timeout(timeout, fastest_rtt) - time.monotonic()) > 0:
+            drain(remaining)
+    finally:
+        selector.close()
+        sender.close()
+        receiver.close()
+    return found
+
+
+def _raw_sockets_available():
+    """Check once whether this process may open raw sockets (CAP_NET_RAW)."""
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP).close()
+        return True
+    except OSError:
+        return False
+
+
+# SYN scanning needs raw sockets; fall back to connect scanning without them
+USE_SYN_SCAN = SCAN_MODE == "syn" and _raw_sockets_available()
+
+
+def _icmp_sweep(ips, timeout=0.05, stop=None):
+    """
+    Ping every IP from a single ICMP socket and return the set that replied.
+
+    Uses a raw socket if permitted, else an unprivileged datagram ICMP socket
+    (needs net.ipv4.ping_group_range). Returns None if neither is available.
+    Returns early once `stop` (a threading.Event) is set.
+    Blocking; run it in an executor.
+    """
+    stop = stop or threading.Event()
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        raw = True
+    except OSError:
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((ip, port))
-            sock.close()
-            return ip if result == 0 else None
-        except:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            raw = False
+        except OSError:
             return None
 
-    # Scan wider range of /24 subnets (pods may be spread across nodes)
-    # App Platform pods can be on very different subnets (e.g., 0, 6, 33)
-    ips_to_scan = [
-        f"{base}.{third}.{fourth}"
-        for third in range(0, 50)  # Scan first 50 subnets
-        for fourth in range(1, 255)
-    ]
+    # For datagram sockets the kernel replaces the identifier with the local port
+    ident = os.getpid() & 0xFFFF
+    header = struct.pack("!BBHHH", 8, 0, 0, ident, 1)
+    packet = header[:2] + struct.pack("!H", _checksum(header)) + header[4:]
+    targets = set(ips)
+    found = set()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
 
-    # Parallel scanning for speed
-    with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
-        results = list(executor.map(check_ip, ips_to_scan))
-        return sorted(set(ip for ip in results if ip))
+    def drain(wait):
+        while selector.select(wait):
+            wait = 0
+            try:
+                data, (src, _) = sock.recvfrom(1024)
+            except BlockingIOError:
+                return
+            if raw:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8 or data[0] != 0:  # echo reply
+                continue
+            if raw and struct.unpack("!H", data[4:6])[0] != ident:
+                continue
+            if src in targets:
+                found.add(src)
 
+    try:
+        for i, ip in enumerate(ips):
+            if stop.is_set():
+                return found
+            try:
+                sock.sendto(packet, (ip, 0))
+            except OSError:
+                continue
+            if i % 256 == 255:
+                drain(0)
+        deadline = time.monotonic() + timeout
+        while not stop.is_set() and (remaining := deadline - time.monotonic()) > 0:
+            drain(remaining)
+    finally:
+        selector.close()
+        sock.close()
+    return found
 
-def get_peer_identity(ip, port=8080, timeout=2.0, retries=2):
+
+async def _run_sweep(sweep, *args, into=None):
+    """
+    Run a blocking sweep on _scan_pool and add its hits to `into` (if given).
+
+    Cancelling the await also stops the sweep: it is signalled and waited for
+    (one select wakeup at most), so a timed-out round doesn't leave sockets
+    open behind it, and the hits it had by then still end up in `into`.
+    """
+    stop = threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_scan_pool, functools.partial(sweep, *args, stop=stop))
+    try:
+        result = await asyncio.shield(future)
+    except asyncio.CancelledError:
+        stop.set()
+        partial = await future
+        if into is not None:
+            into.update(partial)
+        raise
+    if into is not None:
+        into.update(result)
+    return result
+
+
+# ICMP liveness pre-filter for connect scans; disabled for good once the
+# container turns out not to allow ICMP sockets
+_icmp_usable = ICMP_PREFILTER
+_icmp_dead = {}  # ip -> time until which it is skipped
+
+
+async def _icmp_alive(ips):
+    """
+    Return the subset of ips that answer an ICMP echo, in the original order.
+
+    Hosts that didn't answer are skipped for ICMP_NEGATIVE_TTL seconds.
+    Returns None (probe everything) if ICMP isn't usable in this container,
+    or if nobody but ourselves answered, since the network may simply be
+    dropping echo replies.
+    """
+    global _icmp_usable
+    if not _icmp_usable:
+        return None
+
+    now = time.time()
+    candidates = [ip for ip in ips if _icmp_dead.get(ip, 0) <= now]
+    if not candidates:
+        return []
+
+    alive = await _run_sweep(_icmp_sweep, candidates)
+    if alive is None:
+        _icmp_usable = False
+        return None
+    if not alive - {MY_IP}:
+        return None
+
+    expires = now + ICMP_NEGATIVE_TTL
+    for ip in candidates:
+        if ip not in alive:
+            _icmp_dead[ip] = expires
+    return [ip for ip in candidates if ip in alive]
+
+
+@functools.lru_cache(maxsize=None)
+def _subnet_ips(third):
+    """Return the host IPs of the /24 with the given third octet as a tuple."""
+    if 0 <= third < SCAN_MAX_THIRD:
+        return _CANDIDATE_IPS[third * 254:(third + 1) * 254]
+    return tuple(f"{_IP_BASE2}.{third}.{fourth}" for fourth in range(1, 255))
+
+
+async def _scan_thirds(thirds, port, timeout, found=None):
+    """
+    Probe every host in the given /24s for an open port.
+    Returns the set of open IPs and adds them to `found` (if given), which
+    also receives the partial result when the scan is cancelled.
+    """
+    ips_to_scan = [ip for third in thirds for ip in _subnet_ips(third)]
+    if USE_SYN_SCAN:
+        return await _run_sweep(_syn_scan, ips_to_scan, port, timeout, into=found)
+
+    alive = await _icmp_alive(ips_to_scan)
+    if alive is not None:
+        ips_to_scan = alive
+    return await _run_sweep(_bulk_probe, ips_to_scan, port, timeout, into=found)
+
+
+async def discover_peers_async(port=8080, timeout=0.1, found=None, identities=None):
+    """
+    Discover peer replicas by scanning the pod network subnet.
+
+    This works because all pods in the same App Platform app share
+    a network where they can communicate via private IPs.
+
+    A fast pass (FAST_SCAN_TIMEOUT) covers the subnets peers have been seen
+    in plus our own neighbourhood (see _scan_order). The remaining subnets are
+    only swept if that comes up short, and at most every FULL_SCAN_INTERVAL
+    seconds. Probes are half-open SYNs when SCAN_MODE=syn and raw sockets are
+    available, otherwise batches of non-blocking connects (see _bulk_probe),
+    restricted to hosts that answer an ICMP ping.
+
+    An open port is not necessarily a replica (other services in the app may
+    listen on the same port), so whether the fallback is needed is decided by
+    the IPs whose /identity matches SERVICE_NAME. The identities fetched for
+    that are recorded in `identities` (ip -> identity dict, if given) so the
+    caller doesn't have to fetch them again.
+
+    Hits are added to `found` (if given) as each pass ends, so a caller that
+    cancels the scan still keeps what it had turned up, including the hits of
+    the pass that was interrupted. A fallback sweep that is cut short doesn't
+    count towards FULL_SCAN_INTERVAL and is retried next round.
+    """
+    global _last_full_scan
+    found = set() if found is None else found
+    identities = {} if identities is None else identities
+    first_pass, fallback = _scan_order(_MY_THIRD, sorted(_hot_thirds))
+    await _scan_thirds(first_pass, port, FAST_SCAN_TIMEOUT, found)
+    replicas = await _replica_ips(found, port, identities)
+    # Remember which subnets were productive to prime the next scan
+    _hot_thirds.update(int(ip.split(".")[2]) for ip in replicas)
+
+    # Pods may be spread across nodes on very different /24 subnets
+    # (e.g., 0, 6, 33), so the full sweep still covers the first 50 subnets
+    if len(replicas) < REPLICA_COUNT and time.time() - _last_full_scan > FULL_SCAN_INTERVAL:
+        # Peers already answered within the fast timeout, so the sweep can
+        # afford a tighter one
+        full_timeout = timeout / 2 if replicas - {MY_IP} else timeout
+        swept = await _scan_thirds(fallback, port, full_timeout, found)
+        _last_full_scan = time.time()
+        _hot_thirds.update(int(ip.split(".")[2]) for ip in await _replica_ips(swept, port, identities))
+
+    return sorted(found)
+
+
+async def get_peer_identity_async(ip, port=8080, retries=2):
     """
     Get the identity (hostname) of a peer by calling its /identity endpoint.
-    Returns dict with ip, hostname, service or None if unreachable.
+    Returns dict with ip, hostname, service ("unreachable" hostname on failure).
     """
     for attempt in range(retries):
         try:
-            url = f"http://{ip}:{port}/identity"
-            with urlopen(url, timeout=timeout) as response:
-                data = json.loads(response.read().decode())
-                return {
-                    "ip": ip,
-                    "hostname": data.get("hostname", "unknown"),
-                    "service": data.get("service", "unknown")
-                }
-        except (URLError, json.JSONDecodeError, Exception):
+            response = await _http.get(f"http://{ip}:{port}/identity")
+            response.raise_for_status()
+            data = response.json()
+            if not isinstance(data, dict):
+                data = {}
+            hostname = data.get("hostname")
+            service = data.get("service")
+            return {
+                "ip": ip,
+                "hostname": hostname if isinstance(hostname, str) else "unknown",
+                "service": service if isinstance(service, str) else "unknown"
+            }
+        except (httpx.HTTPError, ValueError):
             if attempt < retries - 1:
-                time.sleep(0.2)  # Brief pause before retry
+                await asyncio.sleep(0.2)  # Brief pause before retry
                 continue
     return {"ip": ip, "hostname": "unreachable", "service": "unknown"}
 
 
-def discover_peers_with_identity(port=8080):
+async def _replica_ips(ips, port=8080, identities=None):
+    """
+    Return the subset of ips whose /identity hostname matches SERVICE_NAME.
+    Our own IP always counts. Identities are looked up in, and recorded to,
+    `identities` (ip -> identity dict), so each IP is only fetched once.
+    """
+    identities = {} if identities is None else identities
+
+    async def fetch(ip):
+        identities[ip] = await get_peer_identity_async(ip, port, retries=1)
+
+    await asyncio.gather(*(fetch(ip) for ip in ips if ip != MY_IP and ip not in identities))
+    known = [identities[ip] for ip in ips if ip in identities]
+    replicas = {p["ip"] for p in filter_by_service(known, SERVICE_NAME)}
+    if MY_IP in ips:
+        replicas.add(MY_IP)
+    return replicas
+
+
+def _touch_member(ip, heartbeat=None):
+    """
+    Record that ip is alive. Gossiped entries only count as fresh when their
+    heartbeat has increased; direct contact (heartbeat=None) always does.
+    """
+    now = time.monotonic()
+    entry = _members.get(ip)
+    if entry is None:
+        _members[ip] = {"heartbeat": heartbeat or 0, "updated": now}
+    elif heartbeat is None:
+        entry["updated"] = now
+    elif heartbeat > entry["heartbeat"]:
+        entry["heartbeat"] = heartbeat
+        entry["updated"] = now
+
+
+def _expire_members(max_age=GOSSIP_STALE_AFTER):
+    """Drop members that haven't shown a sign of life for max_age seconds."""
+    cutoff = time.monotonic() - max_age
+    for ip in [ip for ip, entry in _members.items() if entry["updated"] < cutoff]:
+        del _members[ip]
+
+
+async def _fetch_peer_list(ip, port=8080):
+    """
+    Fetch a peer's membership list from its /peers_raw endpoint.
+    Returns (ip, [(member_ip, heartbeat), ...]) or (ip, None) if unreachable.
+    """
+    try:
+        response = await _http.get(f"http://{ip}:{port}/peers_raw")
+        members = [(p["ip"], int(p["heartbeat"])) for p in response.json()["peers"]]
+        return ip, members
+    except (httpx.HTTPError, ValueError, KeyError, TypeError):
+        return ip, None
+
+
+async def gossip_peers(port=8080):
+    """
+    Pull the membership list of every known peer and merge it into ours.
+    Returns the live member IPs, including our own.
+    """
+    targets = [ip for ip in _members if ip != MY_IP]
+    results = await asyncio.gather(*(_fetch_peer_list(ip, port) for ip in targets))
+    for ip, members in results:
+        if members is None:
+            continue
+        _touch_member(ip)
+        for member_ip, heartbeat in members:
+            if member_ip != MY_IP:
+                _touch_member(member_ip, heartbeat)
+    _expire_members()
+    return sorted(set(_members) | {MY_IP})
+
+
+async def _discover_ips(port, gossiped, scanned, identities):
+    """
+    Fill `gossiped` from known peers' membership lists and, only if that
+    yields fewer than REPLICA_COUNT replicas, `scanned` from a subnet scan
+    (recording the identities it fetches in `identities`).
+    Membership only ever holds confirmed replicas, so the quorum check
+    isn't fooled by other services on the same port.
+    """
+    if _members:
+        gossiped.update(await gossip_peers(port=port))
+    if len(gossiped) < REPLICA_COUNT:
+        await discover_peers_async(port=port, found=scanned, identities=identities)
+
+
+async def discover_peers_with_identity(port=8080, deadline=SCAN_DEADLINE):
     """
     Discover peers and fetch their identity (hostname, service name).
     Returns list of dicts with ip, hostname, service.
+
+    Discovery (gossip plus subnet scan) gets `deadline` seconds. When it runs
+    out, outstanding probes are stopped and whatever was found so far is
+    merged with those peers of the last snapshot that are still members.
+    Identities the scan hasn't already fetched are looked up afterwards,
+    outside the deadline; those lookups are bounded by the HTTP client
+    timeout (about 2.2s with the retry), not by `deadline`.
+    """
+    gossiped, scanned, identities = set(), set(), {}
+    try:
+        await asyncio.wait_for(_discover_ips(port, gossiped, scanned, identities), deadline)
+    except asyncio.TimeoutError:
+        _scan_stats["deadline_hit"] += 1
+        gossiped.add(MY_IP)
+        gossiped.update(p["ip"] for p in current_peers() if p["ip"] in _members)
+
+    ips = sorted(gossiped | scanned)
+
+    # Fetch identity for each discovered IP the scan hasn't already looked up,
+    # concurrently over pooled connections
+    missing = [ip for ip in ips if ip not in identities]
+    for peer in await asyncio.gather(*(get_peer_identity_async(ip, port) for ip in missing)):
+        identities[peer["ip"]] = peer
+    peers = [identities[ip] for ip in ips]
+
+    # Only confirmed replicas join the membership; other services on the
+    # same port must not count towards the gossip quorum
+    for peer in filter_by_service(peers, SERVICE_NAME):
+        if peer["ip"] != MY_IP:
+            _touch_member(peer["ip"])
+    return peers
+
+
+def load_cached_peers(path=PEER_CACHE_FILE):
+    """
+    Load the last-known peer list persisted by a previous process.
+    Returns None if there is no usable cache file.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(data, list):
+        return None
+    if not all(
+        isinstance(p, dict) and isinstance(p.get("ip"), str) and isinstance(p.get("hostname"), str)
+        for p in data
+    ):
+        return None
+    return data
+
+
+def save_cached_peers(peers, path=PEER_CACHE_FILE):
+    """Persist the peer list so it survives a process restart."""
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(peers, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+async def _peer_refresher(port=8080, interval=REFRESH_INTERVAL):
+    """
+    Refresh the peer snapshot forever. This is the only writer of _peer_cache;
+    it swaps in a new list rather than mutating the old one, so readers never
+    need a lock.
     """
-    ips = discover_peers(port=port)
+    global _heartbeat
+    while True:
+        _heartbeat += 1
+        try:
+            peers = await discover_peers_with_identity(port=port)
+        except Exception:
+            peers = None  # Keep serving the last snapshot
+        if peers is not None:
+            _peer_cache["data"] = peers
+            save_cached_peers(peers)
+        await asyncio.sleep(interval)
 
-    # Fetch identity for each discovered IP in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        identities = list(executor.map(lambda ip: get_peer_identity(ip, port), ips))
 
-    return identities
+def current_peers():
+    """Return the latest peer snapshot (empty until the first scan completes)."""
+    return _peer_cache["data"] or []
 
 
 def filter_by_service(peers, service_name):
@@ -128,26 +732,23 @@ def filter_by_service(peers, service_name):
     return [p for p in peers if p["hostname"].startswith(service_name)]
 
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """
-    Main page showing replica information and cluster status.
-    Filters to show only replicas of this service (by hostname prefix).
-    Auto-refreshes every 5 seconds to show load balancer rotation.
-    """
-    timestamp = get_timestamp()
-    all_peers = discover_peers_with_identity(port=PORT)
-    peers = filter_by_service(all_peers, SERVICE_NAME)
-    cluster_ok = len(peers) >= REPLICA_COUNT
+# HTML pages: the static <head> (with all the CSS) is streamed first, then
+# the body is rendered from a jinja2 template compiled once at import, which
+# also HTML-escapes the hostnames reported by peers.
+_jinja = jinja2.Environment(
+    autoescape=True, trim_blocks=True, lstrip_blocks=True, keep_trailing_newline=True
+)
+_jinja.globals.update(
+    hostname=HOSTNAME,
+    my_ip=MY_IP,
+    service_name=SERVICE_NAME,
+    port=PORT,
+    replica_count=REPLICA_COUNT
+)
 
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Replica Communication Demo</title>
-    <meta http-equiv="refresh" content="5">
-    <style>
-        * {{ box-sizing: border-box; }}
-        body {{
+_ROOT_CSS = """    <style>
+        * { box-sizing: border-box; }
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
             max-width: 900px;
             margin: 0 auto;
@@ -155,143 +756,152 @@ async def root():
             background: linear-gradient(135deg, #0f0c29 0%, #302b63 50%, #24243e 100%);
             color: #eee;
             min-height: 100vh;
-        }}
-        h1 {{
+        }
+        h1 {
             color: #00d4ff;
             border-bottom: 2px solid #00d4ff;
             padding-bottom: 15px;
             margin-bottom: 10px;
-        }}
-        h2 {{
+        }
+        h2 {
             color: #ff6b6b;
             margin-top: 30px;
             margin-bottom: 15px;
-        }}
-        .timestamp {{
+        }
+        .timestamp {
             color: #888;
             font-size: 0.9em;
             margin-bottom: 20px;
-        }}
-        .box {{
+        }
+        .box {
             background: rgba(255, 255, 255, 0.05);
             border: 1px solid rgba(255, 255, 255, 0.1);
             border-radius: 12px;
             padding: 25px;
             margin: 15px 0;
-        }}
-        .hostname {{
+        }
+        .hostname {
             font-size: 2.2em;
             color: #00ff88;
             font-weight: bold;
             font-family: 'SF Mono', Monaco, monospace;
             text-shadow: 0 0 20px rgba(0, 255, 136, 0.3);
-        }}
-        .ip {{
+        }
+        .ip {
             color: #888;
             font-family: monospace;
             margin-top: 10px;
-        }}
-        .grid {{
+        }
+        .grid {
             display: grid;
             grid-template-columns: repeat(3, 1fr);
             gap: 15px;
             margin: 15px 0;
-        }}
-        .stat {{
+        }
+        .stat {
             background: rgba(0, 0, 0, 0.3);
             padding: 20px;
             border-radius: 10px;
             text-align: center;
-        }}
-        .stat-value {{
+        }
+        .stat-value {
             font-size: 2.5em;
             font-weight: bold;
             color: #00d4ff;
-        }}
-        .stat-value.success {{
+        }
+        .stat-value.success {
             color: #00ff88;
-        }}
-        .stat-label {{
+        }
+        .stat-label {
             font-size: 0.8em;
             color: #888;
             text-transform: uppercase;
             letter-spacing: 1px;
             margin-top: 5px;
-        }}
-        table {{
+        }
+        table {
             width: 100%;
             border-collapse: collapse;
-        }}
-        th, td {{
+        }
+        th, td {
             padding: 12px 15px;
             text-align: left;
             border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-        }}
-        th {{
+        }
+        th {
             color: #00d4ff;
             font-size: 0.85em;
             text-transform: uppercase;
             letter-spacing: 1px;
-        }}
-        code {{
+        }
+        code {
             background: rgba(0, 0, 0, 0.4);
             padding: 3px 8px;
             border-radius: 4px;
             font-family: 'SF Mono', Monaco, monospace;
-        }}
-        .online {{
+        }
+        .online {
             color: #00ff88;
             font-weight: bold;
-        }}
-        .me {{
+        }
+        .me {
             color: #00d4ff;
             font-size: 0.85em;
-        }}
-        .how-it-works {{
+        }
+        .how-it-works {
             display: grid;
             grid-template-columns: 1fr 1fr;
             gap: 15px;
-        }}
-        .how-item {{
+        }
+        .how-item {
             background: rgba(0, 0, 0, 0.2);
             padding: 15px;
             border-radius: 8px;
-        }}
-        .how-item strong {{
+        }
+        .how-item strong {
             color: #00d4ff;
-        }}
-        .refresh-note {{
+        }
+        .refresh-note {
             text-align: center;
             color: #666;
             font-size: 0.85em;
             margin-top: 30px;
             padding: 15px;
             border-top: 1px solid rgba(255, 255, 255, 0.1);
-        }}
+        }
     </style>
-</head>
+"""
+
+_ROOT_HEAD_HTML = """<!DOCTYPE html>
+<html>
+<head>
+    <title>Replica Communication Demo</title>
+    <meta http-equiv="refresh" content="5">
+""" + _ROOT_CSS + """</head>
 <body>
     <h1>Replica Communication Demo</h1>
-    <p class="timestamp">Generated: {timestamp} | Auto-refreshes every 5 seconds</p>
+"""
+
+_ROOT_BODY = _jinja.from_string("""    <p class="timestamp">Generated: {{ timestamp }} | Auto-refreshes every 5 seconds</p>
 
     <div class="box">
         <div style="color: #888; margin-bottom: 5px;">You are being served by:</div>
-        <div class="hostname">{HOSTNAME}</div>
-        <div class="ip">IP Address: {MY_IP} | Service: {SERVICE_NAME}</div>
+        <div class="hostname">{{ hostname }}</div>
+        <div class="ip">IP Address: {{ my_ip }} | Service: {{ service_name }}</div>
     </div>
 
     <h2>Cluster Status</h2>
     <div class="grid">
         <div class="stat">
-            <div class="stat-value">{len(peers)}</div>
+            <div class="stat-value">{{ peers|length }}</div>
             <div class="stat-label">Replicas Found</div>
         </div>
         <div class="stat">
-            <div class="stat-value">{REPLICA_COUNT}</div>
+            <div class="stat-value">{{ replica_count }}</div>
             <div class="stat-label">Expected</div>
         </div>
         <div class="stat">
-            <div class="stat-value {'success' if cluster_ok else ''}">{'OK' if cluster_ok else 'DISCOVERING...'}</div>
+            <div class="stat-value{% if cluster_ok %} success{% endif %}">{{ "OK" if cluster_ok else "DISCOVERING..." }}</div>
             <div class="stat-label">Status</div>
         </div>
     </div>
@@ -305,29 +915,24 @@ async def root():
                 <th>IP Address</th>
                 <th>Status</th>
             </tr>
-"""
-
-    for i, peer in enumerate(peers, 1):
-        is_me = ' <span class="me">(this replica)</span>' if peer["ip"] == MY_IP else ''
-        html += f"""
+{% for peer in peers %}
             <tr>
-                <td>{i}</td>
-                <td><code>{peer["hostname"]}</code>{is_me}</td>
-                <td><code>{peer["ip"]}</code></td>
+                <td>{{ loop.index }}</td>
+                <td><code>{{ peer.hostname }}</code>{% if peer.ip == my_ip %} <span class="me">(this replica)</span>{% endif %}</td>
+                <td><code>{{ peer.ip }}</code></td>
                 <td class="online">Online</td>
             </tr>
-"""
-
-    html += f"""
-        </table>
+{% endfor %}        </table>
     </div>
+""")
 
+_ROOT_TAIL_HTML = _jinja.from_string("""
     <h2>How It Works</h2>
     <div class="box">
         <div class="how-it-works">
             <div class="how-item">
                 <strong>Discovery Method</strong><br>
-                Subnet scanning on port {PORT}
+                Subnet scanning on port {{ port }}
             </div>
             <div class="how-item">
                 <strong>Communication</strong><br>
@@ -335,7 +940,7 @@ async def root():
             </div>
             <div class="how-item">
                 <strong>DNS Pattern</strong><br>
-                <code>{SERVICE_NAME}</code> = round-robin LB
+                <code>{{ service_name }}</code> = round-robin LB
             </div>
             <div class="how-item">
                 <strong>Individual Addressing</strong><br>
@@ -346,68 +951,15 @@ async def root():
 
     <p class="refresh-note">
         Refresh the page multiple times to see different hostnames above.<br>
-        The load balancer rotates between all {REPLICA_COUNT} replicas.
+        The load balancer rotates between all {{ replica_count }} replicas.
     </p>
 </body>
 </html>
-"""
-    return HTMLResponse(content=html)
+""").render()
 
-
-@app.get("/health")
-async def health():
-    """Health check endpoint for App Platform."""
-    return {
-        "status": "healthy",
-        "hostname": HOSTNAME,
-        "ip": MY_IP,
-        "timestamp": time.time()
-    }
-
-
-@app.get("/identity")
-async def identity():
-    """Return this replica's identity."""
-    return {
-        "hostname": HOSTNAME,
-        "ip": MY_IP,
-        "service": SERVICE_NAME,
-        "timestamp": get_timestamp()
-    }
-
-
-@app.get("/peers")
-async def get_peers():
-    """Return list of discovered peer replicas (filtered by service name)."""
-    all_peers = discover_peers_with_identity(port=PORT)
-    peers = filter_by_service(all_peers, SERVICE_NAME)
-    return {
-        "hostname": HOSTNAME,
-        "ip": MY_IP,
-        "service": SERVICE_NAME,
-        "peers": [{"hostname": p["hostname"], "ip": p["ip"]} for p in peers],
-        "count": len(peers),
-        "expected": REPLICA_COUNT
-    }
-
-
-@app.get("/unfiltered", response_class=HTMLResponse)
-async def unfiltered():
-    """
-    Show ALL discovered services on port 8080 without filtering.
-    This reveals other services in the same App Platform app that share the port.
-    """
-    timestamp = get_timestamp()
-    all_peers = discover_peers_with_identity(port=PORT)
-
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Unfiltered Discovery - All Services on Port {PORT}</title>
-    <meta http-equiv="refresh" content="10">
-    <style>
-        * {{ box-sizing: border-box; }}
-        body {{
+_UNFILTERED_CSS = """    <style>
+        * { box-sizing: border-box; }
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
             max-width: 1000px;
             margin: 0 auto;
@@ -415,126 +967,135 @@ async def unfiltered():
             background: linear-gradient(135deg, #1a0a0a 0%, #4a1a1a 50%, #2a1a1a 100%);
             color: #eee;
             min-height: 100vh;
-        }}
-        h1 {{
+        }
+        h1 {
             color: #ff6b6b;
             border-bottom: 2px solid #ff6b6b;
             padding-bottom: 15px;
-        }}
-        h2 {{
+        }
+        h2 {
             color: #ffaa00;
             margin-top: 30px;
-        }}
-        .warning {{
+        }
+        .warning {
             background: rgba(255, 107, 107, 0.2);
             border: 2px solid #ff6b6b;
             border-radius: 10px;
             padding: 20px;
             margin: 20px 0;
-        }}
-        .warning strong {{
+        }
+        .warning strong {
             color: #ff6b6b;
-        }}
-        .timestamp {{
+        }
+        .timestamp {
             color: #888;
             font-size: 0.9em;
             margin-bottom: 20px;
-        }}
-        .box {{
+        }
+        .box {
             background: rgba(255, 255, 255, 0.05);
             border: 1px solid rgba(255, 255, 255, 0.1);
             border-radius: 12px;
             padding: 25px;
             margin: 15px 0;
-        }}
-        .hostname {{
+        }
+        .hostname {
             font-size: 1.8em;
             color: #ff6b6b;
             font-weight: bold;
             font-family: 'SF Mono', Monaco, monospace;
-        }}
-        .grid {{
+        }
+        .grid {
             display: grid;
             grid-template-columns: repeat(3, 1fr);
             gap: 15px;
             margin: 15px 0;
-        }}
-        .stat {{
+        }
+        .stat {
             background: rgba(0, 0, 0, 0.3);
             padding: 20px;
             border-radius: 10px;
             text-align: center;
-        }}
-        .stat-value {{
+        }
+        .stat-value {
             font-size: 2.5em;
             font-weight: bold;
             color: #ffaa00;
-        }}
-        .stat-label {{
+        }
+        .stat-label {
             font-size: 0.8em;
             color: #888;
             text-transform: uppercase;
-        }}
-        table {{
+        }
+        table {
             width: 100%;
             border-collapse: collapse;
-        }}
-        th, td {{
+        }
+        th, td {
             padding: 12px 15px;
             text-align: left;
             border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-        }}
-        th {{
+        }
+        th {
             color: #ffaa00;
             font-size: 0.85em;
             text-transform: uppercase;
-        }}
-        code {{
+        }
+        code {
             background: rgba(0, 0, 0, 0.4);
             padding: 3px 8px;
             border-radius: 4px;
             font-family: 'SF Mono', Monaco, monospace;
-        }}
-        .match {{
+        }
+        .match {
             color: #00ff88;
-        }}
-        .other {{
+        }
+        .other {
             color: #ff6b6b;
-        }}
-        .me {{
+        }
+        .me {
             color: #00d4ff;
             font-size: 0.85em;
-        }}
+        }
     </style>
-</head>
+"""
+
+_UNFILTERED_HEAD_HTML = f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>Unfiltered Discovery - All Services on Port {PORT}</title>
+    <meta http-equiv="refresh" content="10">
+""" + _UNFILTERED_CSS + """</head>
 <body>
     <h1>Unfiltered Discovery</h1>
-    <p class="timestamp">Generated: {timestamp} | Auto-refreshes every 10 seconds</p>
+"""
+
+_UNFILTERED_BODY = _jinja.from_string("""    <p class="timestamp">Generated: {{ timestamp }} | Auto-refreshes every 10 seconds</p>
 
     <div class="warning">
-        <strong>WARNING:</strong> This page shows ALL services discovered on port {PORT} via subnet scanning.
-        This includes services that are NOT replicas of <code>{SERVICE_NAME}</code>.
+        <strong>WARNING:</strong> This page shows ALL services discovered on port {{ port }} via subnet scanning.
+        This includes services that are NOT replicas of <code>{{ service_name }}</code>.
         The filtered view at <code>/</code> shows only matching replicas.
     </div>
 
     <div class="box">
         <div style="color: #888; margin-bottom: 5px;">Current instance:</div>
-        <div class="hostname">{HOSTNAME}</div>
-        <div style="color: #888; margin-top: 5px;">IP: {MY_IP} | Service: {SERVICE_NAME}</div>
+        <div class="hostname">{{ hostname }}</div>
+        <div style="color: #888; margin-top: 5px;">IP: {{ my_ip }} | Service: {{ service_name }}</div>
     </div>
 
     <h2>Discovery Statistics</h2>
     <div class="grid">
         <div class="stat">
-            <div class="stat-value">{len(all_peers)}</div>
+            <div class="stat-value">{{ peers|length }}</div>
             <div class="stat-label">Total Discovered</div>
         </div>
         <div class="stat">
-            <div class="stat-value">{len([p for p in all_peers if p["hostname"].startswith(SERVICE_NAME)])}</div>
-            <div class="stat-label">Match {SERVICE_NAME}</div>
+            <div class="stat-value">{{ matching }}</div>
+            <div class="stat-label">Match {{ service_name }}</div>
         </div>
         <div class="stat">
-            <div class="stat-value">{len([p for p in all_peers if not p["hostname"].startswith(SERVICE_NAME)])}</div>
+            <div class="stat-value">{{ peers|length - matching }}</div>
             <div class="stat-label">Other Services</div>
         </div>
     </div>
@@ -548,26 +1109,19 @@ async def unfiltered():
                 <th>IP Address</th>
                 <th>Matches Service?</th>
             </tr>
-"""
-
-    for i, peer in enumerate(all_peers, 1):
-        is_me = ' <span class="me">(this instance)</span>' if peer["ip"] == MY_IP else ''
-        matches = peer["hostname"].startswith(SERVICE_NAME)
-        match_class = "match" if matches else "other"
-        match_text = "Yes" if matches else "No"
-        html += f"""
+{% for peer in peers %}
+{% set matches = peer.hostname.startswith(service_name) %}
             <tr>
-                <td>{i}</td>
-                <td><code>{peer["hostname"]}</code>{is_me}</td>
-                <td><code>{peer["ip"]}</code></td>
-                <td class="{match_class}">{match_text}</td>
+                <td>{{ loop.index }}</td>
+                <td><code>{{ peer.hostname }}</code>{% if peer.ip == my_ip %} <span class="me">(this instance)</span>{% endif %}</td>
+                <td><code>{{ peer.ip }}</code></td>
+                <td class="{{ "match" if matches else "other" }}">{{ "Yes" if matches else "No" }}</td>
             </tr>
-"""
-
-    html += """
-        </table>
+{% endfor %}        </table>
     </div>
+""")
 
+_UNFILTERED_TAIL_HTML = _jinja.from_string("""
     <div class="box">
         <h3 style="color: #ffaa00; margin-top: 0;">Why are there extra services?</h3>
         <p>Subnet scanning discovers ALL services listening on the specified port in the same App Platform network.
@@ -578,12 +1132,125 @@ async def unfiltered():
             <li>Services from other apps sharing the same node</li>
         </ul>
         <p>The filtered view at <code>/</code> uses the <code>/identity</code> endpoint to verify each
-        discovered service's hostname and only shows those matching <code>""" + SERVICE_NAME + """</code>.</p>
+        discovered service's hostname and only shows those matching <code>{{ service_name }}</code>.</p>
     </div>
 </body>
 </html>
-"""
-    return HTMLResponse(content=html)
+""").render()
+
+
+async def _render_root():
+    """Stream the main page: static head first, then the peer table."""
+    yield _ROOT_HEAD_HTML
+    peers = filter_by_service(current_peers(), SERVICE_NAME)
+    yield _ROOT_BODY.render(
+        timestamp=get_timestamp(),
+        peers=peers,
+        cluster_ok=len(peers) >= REPLICA_COUNT
+    )
+    yield _ROOT_TAIL_HTML
+
+
+@app.get("/", response_class=HTMLResponse)
+async def root():
+    """
+    Main page showing replica information and cluster status.
+    Filters to show only replicas of this service (by hostname prefix).
+    Auto-refreshes every 5 seconds to show load balancer rotation.
+    """
+    return StreamingResponse(_render_root(), media_type="text/html")
+
+
+@app.get("/health")
+async def health():
+    """Health check endpoint for App Platform."""
+    return {
+        "status": "healthy",
+        "hostname": HOSTNAME,
+        "ip": MY_IP,
+        "timestamp": time.time()
+    }
+
+
+@app.get("/identity")
+async def identity():
+    """Return this replica's identity."""
+    return {
+        "hostname": HOSTNAME,
+        "ip": MY_IP,
+        "service": SERVICE_NAME,
+        "timestamp": get_timestamp()
+    }
+
+
+@app.get("/peers")
+async def get_peers():
+    """Return list of discovered peer replicas (filtered by service name)."""
+    all_peers = current_peers()
+    peers = filter_by_service(all_peers, SERVICE_NAME)
+    return {
+        "hostname": HOSTNAME,
+        "ip": MY_IP,
+        "service": SERVICE_NAME,
+        "peers": [{"hostname": p["hostname"], "ip": p["ip"]} for p in peers],
+        "count": len(peers),
+        "expected": REPLICA_COUNT,
+        "scan_deadline_hit": _scan_stats["deadline_hit"]
+    }
+
+
+@app.get("/peers_raw")
+async def peers_raw():
+    """Return this replica's gossip membership table (IPs and heartbeats)."""
+    peers = [{"ip": MY_IP, "heartbeat": _heartbeat}]
+    peers.extend(
+        {"ip": ip, "heartbeat": entry["heartbeat"]}
+        for ip, entry in _members.items()
+        if ip != MY_IP
+    )
+    return {"peers": peers}
+
+
+async def _render_unfiltered():
+    """Stream the unfiltered page: static head first, then the peer table."""
+    yield _UNFILTERED_HEAD_HTML
+    peers = current_peers()
+    yield _UNFILTERED_BODY.render(
+        timestamp=get_timestamp(),
+        peers=peers,
+        matching=sum(1 for p in peers if p["hostname"].startswith(SERVICE_NAME))
+    )
+    yield _UNFILTERED_TAIL_HTML
+
+
+@app.get("/unfiltered", response_class=HTMLResponse)
+async def unfiltered():
+    """
+    Show ALL discovered services on port 8080 without filtering.
+    This reveals other services in the same App Platform app that share the port.
+    """
+    return StreamingResponse(_render_unfiltered(), media_type="text/html")
+
+
+@app.on_event("startup")
+async def startup():
+    """Serve the persisted peer list right away and start background discovery."""
+    global _refresher
+    persisted = load_cached_peers()
+    if persisted is not None:
+        _peer_cache["data"] = persisted
+        for peer in filter_by_service(persisted, SERVICE_NAME):
+            if peer["ip"] != MY_IP:
+                _touch_member(peer["ip"])
+    _refresher = asyncio.create_task(_peer_refresher(port=PORT))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background discovery and close pooled peer connections."""
+    if _refresher is not None:
+        _refresher.cancel()
+    await _http.aclose()
 
 
 if __name__ == "__main__":